@@ -1,9 +1,14 @@
 from pathlib import Path
+from typing import Iterator
 
 import pytest
 from dash.testing.composite import DashComposite
 from selenium.webdriver.chrome.options import Options
 
+# Import the app once at collection time, so that dash.page_registry
+# is populated a single time and reused by all integration test modules
+import wazp.app  # noqa: F401
+
 
 class Helpers:
     """A class to group helpful things when writing tests.
@@ -46,6 +51,26 @@ def helpers():
     return Helpers
 
 
+@pytest.fixture
+def dash_duo(dash_duo: DashComposite) -> Iterator[DashComposite]:
+    """Extend the default dash_duo fixture from dash.testing.
+
+    The implicit wait that dash.testing sets on the webdriver is disabled,
+    so that it does not compound with the explicit waits used in the tests
+    (e.g. `wait_for_element`, `wait_for_text_to_equal`). Elements that may
+    not be rendered yet should be located with an explicit wait.
+
+    After the test, the browser console is checked for errors once,
+    so tests do not need to assert this themselves.
+    """
+    dash_duo.driver.implicitly_wait(0)
+    yield dash_duo
+
+    # check there are no errors in browser console
+    logs = dash_duo.get_logs()
+    assert not logs, f"There are {len(logs)} errors in the browser console: {logs}"
+
+
 def pytest_setup_options():
     options = Options()
     options.add_argument("--headless")
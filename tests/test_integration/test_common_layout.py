@@ -1,6 +1,7 @@
 import pytest
 import selenium
 from dash.testing.composite import DashComposite
+from dash.testing.wait import until
 
 from wazp.app import app
 
@@ -15,6 +16,8 @@ def test_components_created(
     - the page content container, and
     - the sidebar.
 
+    Errors in the browser console are checked by the dash_duo fixture.
+
     Parameters
     ----------
     dash_duo : DashComposite
@@ -38,10 +41,6 @@ def test_components_created(
     except selenium.common.exceptions.TimeoutException:
         pytest.fail("Sidebar component not generated")
 
-    # check there are no errors in browser console
-    assert dash_duo.get_logs() == [], f"There are {len(dash_duo.get_logs())} errors"
-    " in the browser console!"
-
 
 unloaded_config_xfail = pytest.mark.xfail(
     raises=AssertionError,
@@ -57,9 +56,6 @@ unloaded_config_xfail = pytest.mark.xfail(
 )
 
 
-# Q for review: is there a way to have this with
-# one fixture only?
-# https://docs.pytest.org/en/latest/how-to/skipping.html#skip-xfail-with-parametrize
 @pytest.mark.parametrize(
     ("page_name_and_title"),
     [
@@ -75,22 +71,29 @@ unloaded_config_xfail = pytest.mark.xfail(
 )
 def test_sidebar_links(
     dash_duo: DashComposite,
-    page_name_and_title: tuple[str],
+    page_name_and_title: str,
     timeout: float,
     request: pytest.FixtureRequest,
 ) -> None:
     """Check the sidebar links take to the corresponding pages
     and that no errors occur in the browser console
 
-    The pages are checked via their title.
+    The pages are checked via their title. Each page is visited in its
+    own browser session, so that console errors are attributed to the
+    page that raised them. The browser console is only checked once the
+    page's callbacks have settled.
+
+    The pages that require a project config are expected to show errors
+    in the browser console when no config has been loaded (hence the
+    marked xfails).
 
     Parameters
     ----------
     dash_duo : DashComposite
         Default fixture for Dash Python integration tests.
-    page_name_and_title : tuple[str]
-        name of the page in the dash registry and the main title shown on
-        the page
+    page_name_and_title : str
+        name of the fixture returning the name of the page in the dash
+        registry and the main title shown on the page
     timeout : float
         maximum time to wait in seconds for a component
     request : pytest.FixtureRequest
@@ -103,20 +106,21 @@ def test_sidebar_links(
     """
 
     # get fixture value
-    (page_name, page_title) = request.getfixturevalue(page_name_and_title)
+    page_name, page_title = request.getfixturevalue(page_name_and_title)
 
     # start server
     dash_duo.start_server(app)
+    dash_duo.wait_for_element("#sidebar", timeout=timeout)
 
     # click sidebar link
-    dash_duo.find_element(
+    dash_duo.driver.execute_script(
+        "document.querySelector(arguments[0]).click();",
         "#sidebar #link-" + page_name.replace(" ", "-"),
-    ).click()
+    )
 
     # check page title is expected
     try:
         dash_duo.wait_for_text_to_equal("h1", page_title, timeout=timeout)
-
     except selenium.common.exceptions.TimeoutException:
         pytest.fail(
             f"Timeout waiting for page {page_name} "
@@ -124,9 +128,14 @@ def test_sidebar_links(
             f"{page_title}"
         )
 
-    dash_duo.find_element("#sidebar #link-Home").click()
-    # TODO: if no config file has been loaded, check a warning is shown?
-    # ...
+    # wait for the page's callbacks to settle
+    # (dash sets the document title to "Updating..." while they run)
+    until(lambda: dash_duo.driver.title != "Updating...", timeout)
 
+    # TODO: if no config file has been loaded, check a warning is shown?
     # NOTE: this is expected to fail for a few pages (hence the marked xfails)
-    assert dash_duo.get_logs() == [], "There are errors in the browser console!"
+    logs = dash_duo.get_logs()
+    assert not logs, (
+        f"There are {len(logs)} errors in the browser console "
+        f"for page {page_name}: {logs}"
+    )
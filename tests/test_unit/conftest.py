@@ -1,4 +1,7 @@
+import os
+import tempfile
 from pathlib import Path
+from typing import Iterator
 
 import pytest
 
@@ -9,3 +12,19 @@ from wazp.datasets import get_sample_project
 def sample_project() -> Path:
     """Get the sample project for testing."""
     return get_sample_project("jewel-wasp", "short-clips_compressed", progressbar=True)
+
+
+@pytest.fixture()
+def fast_tmp_path(tmp_path: Path) -> Iterator[Path]:
+    """Get an empty temporary directory, in memory if possible.
+
+    The directory is created in /dev/shm (a tmpfs on Linux) if it is
+    available and writable, to avoid disk I/O. Otherwise pytest's
+    tmp_path is used.
+    """
+    shm_dir = Path("/dev/shm")
+    if shm_dir.is_dir() and os.access(shm_dir, os.W_OK):
+        with tempfile.TemporaryDirectory(dir=shm_dir, prefix="wazp-test-") as d:
+            yield Path(d)
+    else:
+        yield tmp_path
@@ -1,10 +1,21 @@
+import base64
 import glob
-import tempfile
 
+import numpy as np
 import pytest
 import yaml
+from PIL import Image
 
-from wazp.utils import df_from_metadata_yaml_files
+from wazp.utils import (
+    df_from_metadata_yaml_files,
+    df_from_metadata_yaml_files_cached,
+    get_num_frames_cached,
+    list_files_in_dir,
+    load_frame_data_uri_cached,
+    load_yaml_content_cached,
+    load_yaml_file_cached,
+    set_edited_row_checkbox_to_true,
+)
 
 
 @pytest.fixture
@@ -38,24 +49,156 @@ def test_columns_names_and_nrows_in_df_from_metadata(
     assert nrows == nfiles, "Number of rows in df != number of yaml files."
 
 
-def test_df_from_metadata_yaml_no_metadata(metadata_fields) -> None:
+def test_df_from_metadata_yaml_no_metadata(metadata_fields, fast_tmp_path) -> None:
     """
     Test with no metadata files (expect just to create an empty dataframe with
     metadata_fields column headers).
     """
-    with tempfile.TemporaryDirectory() as empty_existing_directory:
-        df_output = df_from_metadata_yaml_files(
-            empty_existing_directory, metadata_fields
-        )
+    df_output = df_from_metadata_yaml_files(fast_tmp_path, metadata_fields)
 
     assert df_output.shape == (1, len(metadata_fields))
 
 
-def test_df_from_metadata_garbage() -> None:
+def test_df_from_metadata_garbage(fast_tmp_path) -> None:
     """Check we don't get metadata for things that don't exist."""
     with pytest.raises(FileNotFoundError):
         df_from_metadata_yaml_files("DIRECTORY_DOESNT_EXIST", dict())
 
-    with tempfile.TemporaryDirectory() as empty_existing_directory:
-        df_output = df_from_metadata_yaml_files(empty_existing_directory, dict())
+    df_output = df_from_metadata_yaml_files(fast_tmp_path, dict())
     assert df_output.empty, "There shouldn't be any data in the df."
+
+
+def test_load_yaml_file_cached(fast_tmp_path) -> None:
+    """Check the cached yaml data is reused only while the file is unchanged,
+    and that modifying the returned data does not modify the cache."""
+    yaml_path = fast_tmp_path / "test.yaml"
+    yaml_path.write_text("key: 1\n")
+
+    data = load_yaml_file_cached(yaml_path)
+    assert data == {"key": 1}
+
+    data["key"] = 2
+    assert load_yaml_file_cached(yaml_path) == {"key": 1}
+
+    yaml_path.write_text("key: 10\nother_key: 20\n")
+    assert load_yaml_file_cached(yaml_path) == {"key": 10, "other_key": 20}
+
+
+def test_load_yaml_content_cached() -> None:
+    """Check parsing the same yaml content twice gives equal but distinct
+    data, and that different content gives different data."""
+    content = b"videos_dir_path: /videos\nROI_tags: [nest, food]\n"
+
+    data = load_yaml_content_cached(content)
+    data_again = load_yaml_content_cached(content)
+    assert data == {"videos_dir_path": "/videos", "ROI_tags": ["nest", "food"]}
+    assert data_again == data
+    assert data_again is not data
+    assert data_again["ROI_tags"] is not data["ROI_tags"]
+
+    assert load_yaml_content_cached(b"videos_dir_path: /other\n") == {
+        "videos_dir_path": "/other"
+    }
+
+
+def test_df_from_metadata_yaml_files_cached(fast_tmp_path) -> None:
+    """Check the cached dataframe is updated when a metadata file is
+    added or overwritten."""
+    (fast_tmp_path / "a.metadata.yaml").write_text("File: a.mp4\nSpecies: ant\n")
+
+    df_output = df_from_metadata_yaml_files_cached(fast_tmp_path, dict())
+    assert df_output["Species"].tolist() == ["ant"]
+
+    (fast_tmp_path / "b.metadata.yaml").write_text("File: b.mp4\nSpecies: bee\n")
+    df_output = df_from_metadata_yaml_files_cached(fast_tmp_path, dict())
+    assert sorted(df_output["Species"]) == ["ant", "bee"]
+
+    (fast_tmp_path / "a.metadata.yaml").write_text(
+        "File: a.mp4\nSpecies: aphid-aphid\n"
+    )
+    df_output = df_from_metadata_yaml_files_cached(fast_tmp_path, dict())
+    assert sorted(df_output["Species"]) == ["aphid-aphid", "bee"]
+
+
+def test_set_edited_row_checkbox_to_true() -> None:
+    """Check only the edited rows are added to the selected rows."""
+    data_previous = [
+        {"File": "a.mp4", "Species": "ant"},
+        {"File": "b.mp4", "Species": "bee"},
+        {"File": "c.mp4", "Species": "cricket"},
+    ]
+    data = [
+        {"File": "a.mp4", "Species": "ant"},
+        {"File": "b.mp4", "Species": "bumblebee"},
+        {"File": "c.mp4", "Species": "cricket"},
+    ]
+
+    assert set_edited_row_checkbox_to_true(data_previous, data, [0]) == [0, 1]
+    assert set_edited_row_checkbox_to_true(data_previous, data, [1]) == [1]
+    assert set_edited_row_checkbox_to_true(data_previous, data_previous, []) == []
+
+
+def test_list_files_in_dir(fast_tmp_path) -> None:
+    """Check only the regular, non-hidden files with a matching suffix
+    are listed, regardless of the suffix's case."""
+    for name in ["a.mp4", "b.AVI", "c.metadata.yaml", ".d.mp4"]:
+        (fast_tmp_path / name).write_text("")
+    (fast_tmp_path / "e.mp4").mkdir()
+
+    list_videos = list_files_in_dir(fast_tmp_path, (".avi", ".mp4"))
+    assert sorted(entry.name for entry in list_videos) == ["a.mp4", "b.AVI"]
+    assert len(list_files_in_dir(fast_tmp_path)) == 3
+
+
+def test_get_num_frames_cached(fast_tmp_path, monkeypatch) -> None:
+    """Check the number of frames is only read from the video
+    if it is not cached or the video has changed."""
+    video_path = fast_tmp_path / "video.mp4"
+    video_path.write_bytes(b"0")
+    cache_dir = fast_tmp_path / "cache"
+
+    list_calls = []
+
+    def mock_get_num_frames(video_path) -> int:
+        list_calls.append(video_path)
+        return 100 * len(list_calls)
+
+    monkeypatch.setattr("wazp.utils.get_num_frames", mock_get_num_frames)
+
+    assert get_num_frames_cached(video_path, cache_dir) == 100
+    assert get_num_frames_cached(video_path, cache_dir) == 100
+    assert len(list_calls) == 1
+
+    video_path.write_bytes(b"00")
+    assert get_num_frames_cached(video_path, cache_dir) == 200
+    assert len(list_calls) == 2
+
+
+def test_get_num_frames_cached_errors(fast_tmp_path, monkeypatch) -> None:
+    """Check a missing video raises a RuntimeError, and that the number
+    of frames is still returned if it cannot be cached."""
+    with pytest.raises(RuntimeError):
+        get_num_frames_cached(fast_tmp_path / "missing.mp4", fast_tmp_path)
+
+    video_path = fast_tmp_path / "video.mp4"
+    video_path.write_bytes(b"0")
+    # a file where the cache directory should be
+    cache_dir = fast_tmp_path / "cache"
+    cache_dir.write_text("")
+    monkeypatch.setattr("wazp.utils.get_num_frames", lambda video_path: 100)
+
+    assert get_num_frames_cached(video_path, cache_dir) == 100
+
+
+def test_load_frame_data_uri_cached(fast_tmp_path) -> None:
+    """Check a loaded frame is a data URI of the image file,
+    which is reused while the file is unchanged."""
+    frame_path = fast_tmp_path / "video_frame-0.png"
+    frame_data = np.zeros((4, 6, 3), dtype=np.uint8)
+    Image.fromarray(frame_data).save(frame_path)
+
+    frame_data_uri = load_frame_data_uri_cached(frame_path)
+    header, _, frame_b64 = frame_data_uri.partition(",")
+    assert header == "data:image/png;base64"
+    assert base64.b64decode(frame_b64) == frame_path.read_bytes()
+    assert load_frame_data_uri_cached(frame_path) is frame_data_uri
@@ -1,4 +1,5 @@
 import datetime
+import os
 import pathlib as pl
 import re
 
@@ -38,29 +39,33 @@ def create_video_data_table(app_storage: dict) -> dash_table.DataTable:
         dash DataTable component to pass to the table container
     """
 
-    # video metadata as dataframe with File column only
-    df_metadata = utils.df_from_metadata_yaml_files(
+    # list of videos w/ metadata
+    # (only the key field of the video metadata dataframe is needed)
+    key_field = app_storage["config"]["metadata_key_field_str"]
+    list_videos_w_metadata = utils.df_from_metadata_yaml_files_cached(
         app_storage["config"]["videos_dir_path"],
         app_storage["metadata_fields"],
-    )
-    df_metadata = df_metadata[[app_storage["config"]["metadata_key_field_str"]]]
-
-    # list of metadata files
-    list_videos_w_metadata = [
-        pl.Path(v).stem
-        for v in df_metadata[app_storage["config"]["metadata_key_field_str"]].tolist()
-    ]
-
-    # list of videos w/ h5 files
-    # TODO for refactoring: have this in utils?
-    list_videos_w_pose_results = []
-    for f in pl.Path(app_storage["config"]["pose_estimation_results_path"]).iterdir():
-        if str(f).endswith(".h5"):
-            list_videos_w_pose_results.append(re.sub("DLC.*$", "", f.stem))
-
-    # append status of h5 file per video to table
-    df_metadata[POSE_DATA_STR] = [
-        TRUE_EMOJI if v in list_videos_w_pose_results else FALSE_EMOJI
+    )[key_field].tolist()
+
+    # set of videos w/ h5 files
+    # (the video stem is the h5 file stem, up to the "DLC" model suffix)
+    set_videos_w_pose_results = {
+        re.sub("DLC.*$", "", os.path.splitext(entry.name)[0])
+        for entry in utils.list_files_in_dir(
+            app_storage["config"]["pose_estimation_results_path"], ".h5"
+        )
+    }
+
+    # table rows: video file and status of its h5 file
+    table_rows = [
+        {
+            key_field: v,
+            POSE_DATA_STR: (
+                TRUE_EMOJI
+                if pl.Path(v).stem in set_videos_w_pose_results
+                else FALSE_EMOJI
+            ),
+        }
         for v in list_videos_w_metadata
     ]
 
@@ -68,7 +73,7 @@ def create_video_data_table(app_storage: dict) -> dash_table.DataTable:
     # TODO for refactoring: factor out css style?
     return dash_table.DataTable(
         id="video-data-table",
-        data=df_metadata.to_dict("records"),
+        data=table_rows,
         selected_rows=[],
         editable=False,
         row_selectable="multi",
@@ -463,14 +468,12 @@ def get_callbacks(app: dash.Dash) -> None:
         ]
 
         # ---------------------------
-        # If 'select all' button is clicked
-        if n_clicks_select_all > 0:
+        # If 'select all' or 'unselect all' button is clicked
+        # (only one of them can trigger the callback at a time)
+        if n_clicks_select_all:
             list_selected_rows = list(range(len(videos_table_data)))
             n_clicks_select_all = 0
-
-        # ----------------------
-        # If unselect all button is clicked
-        if n_clicks_unselect_all > 0:
+        elif n_clicks_unselect_all:
             list_selected_rows = []
             n_clicks_unselect_all = 0
 
@@ -505,11 +508,9 @@ def get_callbacks(app: dash.Dash) -> None:
             else:
 
                 # get list of selected videos
+                key_field = app_storage["config"]["metadata_key_field_str"]
                 list_selected_videos = [
-                    videos_table_data[r][
-                        app_storage["config"]["metadata_key_field_str"]
-                    ]
-                    for r in list_selected_rows
+                    videos_table_data[r][key_field] for r in list_selected_rows
                 ]
 
                 # get slider labels
@@ -2,9 +2,10 @@ import base64
 from typing import Any
 
 import dash
-import yaml
 from dash import Input, Output, State
 
+from wazp import utils
+
 
 def get_callbacks(app: dash.Dash) -> None:
     """Return all callback functions for the home tab.
@@ -61,15 +62,20 @@ def get_callbacks(app: dash.Dash) -> None:
         output_message = ""
         output_color = "light"
         if up_content is not None:
-            _, content_str = up_content.split(",")
             try:
-                if "yaml" in up_filename:
+                # check the file extension before decoding its content
+                if up_filename.lower().endswith((".yaml", ".yml")):
+                    _, _, content_str = up_content.partition(",")
                     # get config
-                    config = yaml.safe_load(base64.b64decode(content_str))
+                    # (parsed yaml is cached, for repeated uploads)
+                    config = utils.load_yaml_content_cached(
+                        base64.b64decode(content_str)
+                    )
 
                     # get metadata fields dict
-                    with open(config["metadata_fields_file_path"]) as mdf:
-                        metadata_fields_dict = yaml.safe_load(mdf)
+                    metadata_fields_dict = utils.load_yaml_file_cached(
+                        config["metadata_fields_file_path"]
+                    )
 
                     # bundle data
                     data_to_store = {
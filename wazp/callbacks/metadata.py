@@ -1,19 +1,16 @@
 import base64
 import io
+import os
 import pathlib as pl
-import re
 
 import dash
 import dash_bootstrap_components as dbc
 import pandas as pd
 import yaml
-from dash import Input, Output, State, dash_table, dcc, html
+from dash import Input, Output, Patch, State, dash_table, dcc, html
 
 from wazp import utils
 
-# TODO: other video extensions? have this in project config file instead?
-VIDEO_TYPES = [".avi", ".mp4"]
-
 
 ##########################
 # Fns to create components
@@ -194,6 +191,95 @@ def create_metadata_table_component_from_df(
     return table
 
 
+##########################
+# Static components
+###########################
+# (these do not depend on the project, so they are built only once)
+# TODO: define style of all buttons separately?
+BUTTON_STYLE = {
+    "outline": False,
+    "color": "light",
+    "class_name": "w-100",
+}
+# (text, id) of the auxiliary buttons above the table
+AUXILIARY_BUTTONS = [
+    ("Check for missing metadata files", "add-rows-for-missing-button"),
+    ("Add empty row", "add-row-manually-button"),
+    ("Select all rows", "select-all-rows-button"),
+    ("Unselect all rows", "unselect-all-rows-button"),
+    ("Export selected rows as yaml", "export-selected-rows-button"),
+]
+AUXILIARY_BUTTONS_ROW = dbc.Row(
+    [
+        dbc.Col(
+            dbc.Button(
+                children=button_text,
+                id=button_id,
+                n_clicks=0,
+                **BUTTON_STYLE,
+            ),
+            width="auto",
+        )
+        for button_text, button_id in AUXILIARY_BUTTONS
+    ]
+    + [
+        dbc.Col(
+            dcc.Upload(
+                id="upload-spreadsheet",
+                children=dbc.Button(
+                    children=("Generate yaml files from spreadsheet"),
+                    id="generate-yaml-files-button",
+                    n_clicks=0,
+                    **BUTTON_STYLE,  # {"margin-right": "10px"},
+                ),
+                contents=None,
+                multiple=False,
+            ),
+            width="auto",
+        ),
+    ],
+    justify="start",
+)
+
+ALERT_MESSAGE_ROW = dbc.Row(
+    dbc.Alert(
+        children="",
+        id="alert",
+        dismissable=True,
+        fade=False,
+        is_open=False,
+    ),
+)
+
+IMPORT_MESSAGE_ROW = dbc.Row(
+    dbc.Alert(
+        children="",
+        id="import-message",
+        dismissable=True,
+        fade=False,
+        is_open=False,
+    ),
+)
+
+# check for missing metadata files
+CHECK_MISSING_FILES_TOOLTIP = dbc.Tooltip(
+    "Check which videos in the "
+    "video directory are metadata "
+    "and add a row for each of them. Note "
+    "this won't save the metadata.",
+    target="add-rows-for-missing-button",
+)
+
+GENERATE_YAML_TOOLTIP = dbc.Tooltip(
+    "Generate metadata files from a selected spreadsheet. "
+    "Rows in the spreadsheet that do not correspond to a "
+    "video will be ignored."
+    "WARNING! This will overwrite any existing metadata "
+    "files with the same name!",
+    target="generate-yaml-files-button",
+)
+
+
 #############################
 # Callbacks
 ###########################
@@ -239,134 +325,28 @@ def get_callbacks(app: dash.Dash) -> None:
             the auxiliary buttons for common table manipulations
         """
 
-        if not metadata_output_children:
-            metadata_table = create_metadata_table_component_from_df(
-                utils.df_from_metadata_yaml_files(
-                    app_storage["config"]["videos_dir_path"],
-                    app_storage["metadata_fields"],
-                ),
-                app_storage["config"],
-            )
-
-            # TODO: define style of all buttons separately?
-            button_style = {
-                "outline": False,
-                "color": "light",
-                "class_name": "w-100",
-            }
-            auxiliary_buttons_row = dbc.Row(
-                [
-                    dbc.Col(
-                        dbc.Button(
-                            children="Check for missing metadata files",
-                            id="add-rows-for-missing-button",
-                            n_clicks=0,
-                            **button_style,
-                        ),
-                        width="auto",
-                    ),
-                    dbc.Col(
-                        dbc.Button(
-                            children="Add empty row",
-                            id="add-row-manually-button",
-                            n_clicks=0,
-                            **button_style,  # {"margin-right": "10px"},
-                        ),
-                        width="auto",
-                    ),
-                    dbc.Col(
-                        dbc.Button(
-                            children="Select all rows",
-                            id="select-all-rows-button",
-                            n_clicks=0,
-                            **button_style,  # {"margin-right": "10px"},
-                        ),
-                        width="auto",
-                    ),
-                    dbc.Col(
-                        dbc.Button(
-                            children="Unselect all rows",
-                            id="unselect-all-rows-button",
-                            n_clicks=0,
-                            **button_style,  # {"margin-right": "10px"},
-                        ),
-                        width="auto",
-                    ),
-                    dbc.Col(
-                        dbc.Button(
-                            children="Export selected rows as yaml",
-                            id="export-selected-rows-button",
-                            n_clicks=0,
-                            **button_style,  # {"margin-right": "10px"},
-                        ),
-                        width="auto",
-                    ),
-                    dbc.Col(
-                        dcc.Upload(
-                            id="upload-spreadsheet",
-                            children=dbc.Button(
-                                children=("Generate yaml files from spreadsheet"),
-                                id="generate-yaml-files-button",
-                                n_clicks=0,
-                                **button_style,  # {"margin-right": "10px"},
-                            ),
-                            contents=None,
-                            multiple=False,
-                        ),
-                        width="auto",
-                    ),
-                ],
-                justify="start",
-            )
-
-            alert_message_row = dbc.Row(
-                dbc.Alert(
-                    children="",
-                    id="alert",
-                    dismissable=True,
-                    fade=False,
-                    is_open=False,
-                ),
-            )
+        # If the table has already been created: do not update
+        if metadata_output_children:
+            return dash.no_update
 
-            import_message_row = dbc.Row(
-                dbc.Alert(
-                    children="",
-                    id="import-message",
-                    dismissable=True,
-                    fade=False,
-                    is_open=False,
-                ),
-            )
-
-            # check for missing metadata files
-            check_missing_files_tooltip = dbc.Tooltip(
-                "Check which videos in the "
-                "video directory are metadata "
-                "and add a row for each of them. Note "
-                "this won't save the metadata.",
-                target="add-rows-for-missing-button",
-            )
-
-            generate_yaml_tooltip = dbc.Tooltip(
-                "Generate metadata files from a selected spreadsheet. "
-                "Rows in the spreadsheet that do not correspond to a "
-                "video will be ignored."
-                "WARNING! This will overwrite any existing metadata "
-                "files with the same name!",
-                target="generate-yaml-files-button",
-            )
+        metadata_table = create_metadata_table_component_from_df(
+            utils.df_from_metadata_yaml_files_cached(
+                app_storage["config"]["videos_dir_path"],
+                app_storage["metadata_fields"],
+            ),
+            app_storage["config"],
+        )
 
-            return html.Div(
-                [
-                    metadata_table,
-                    auxiliary_buttons_row,
-                    alert_message_row,
-                    import_message_row,
-                    check_missing_files_tooltip,
-                    generate_yaml_tooltip,
-                ]
-            )
+        return html.Div(
+            [
+                metadata_table,
+                AUXILIARY_BUTTONS_ROW,
+                ALERT_MESSAGE_ROW,
+                IMPORT_MESSAGE_ROW,
+                CHECK_MISSING_FILES_TOOLTIP,
+                GENERATE_YAML_TOOLTIP,
+            ]
+        )
 
     @app.callback(
         Output("metadata-table", "data"),
@@ -384,7 +364,7 @@ def get_callbacks(app: dash.Dash) -> None:
         table_rows: list[dict],
         table_columns: list[dict],
         app_storage: dict,
-    ) -> tuple[list[dict], int, int]:
+    ) -> tuple[Patch, int, int]:
         """Add rows to metadata table.
 
         Rows are added either manually or semiautomatically based on videos
@@ -407,73 +387,107 @@ def get_callbacks(app: dash.Dash) -> None:
 
         Returns
         -------
-        table_rows : list[dict]
-            a list of dictionaries holding the data of each row in the table
+        table_rows_patch : Patch
+            the changes to the list of dictionaries holding the data
+            of each row in the table
         n_clicks_add_row_manually : int
             number of clicks on the 'add row manually' button
         n_clicks_add_rows_missing : int
             number of clicks on the 'add missing rows' button
         """
 
+        # If neither button was clicked: do not update
+        if n_clicks_add_row_manually == 0 and n_clicks_add_rows_missing == 0:
+            return dash.no_update, dash.no_update, dash.no_update
+
+        # Template for an empty row
+        empty_row = dict.fromkeys([c["id"] for c in table_columns], "")
+
+        # Only send the changes to the table data to the browser
+        table_rows_patch = Patch()
+
         # Add empty rows manually
         if n_clicks_add_row_manually > 0 and table_columns:
-            table_rows.append({c["id"]: "" for c in table_columns})
+            table_rows_patch.append(empty_row.copy())
             n_clicks_add_row_manually = 0  # reset clicks
 
         # Add rows for videos w/ missing metadata
         if n_clicks_add_rows_missing > 0 and table_columns:
-            # Read config for videos directory
+            # Read config for videos directory and key field
             video_dir = app_storage["config"]["videos_dir_path"]
+            key_field = app_storage["config"]["metadata_key_field_str"]
 
             # List of files currently shown in table
-            list_files_in_table = [
-                d[app_storage["config"]["metadata_key_field_str"]] for d in table_rows
-            ]
+            # (and as a set, for fast membership checks)
+            list_files_in_table = [d[key_field] for d in table_rows]
+            set_files_in_table = set(list_files_in_table)
 
             # List of videos w/o metadata and not in table
+            # (the videos and their metadata files are listed together,
+            # and metadata files are stored by their video's stem)
             list_video_files = []
-            list_metadata_files = []
-            for f in pl.Path(video_dir).iterdir():
-                if str(f).endswith(".metadata.yaml"):
-                    list_metadata_files.append(re.sub(".metadata$", "", f.stem))
-                elif any(v in str(f) for v in VIDEO_TYPES):
-                    list_video_files.append(f)  # list of PosixPaths
+            set_metadata_files = set()
+            for entry in utils.list_files_in_dir(
+                video_dir, (".metadata.yaml", *utils.VIDEO_SUFFIXES)
+            ):
+                name = entry.name
+                if name.lower().endswith(".metadata.yaml"):
+                    set_metadata_files.add(name[: -len(".metadata.yaml")])
+                else:
+                    list_video_files.append(name)
             list_videos_wo_metadata = [
-                f.name
-                for f in list_video_files
-                if (f.stem not in list_metadata_files)
-                and (f.name not in list_files_in_table)
+                name
+                for name in list_video_files
+                if (os.path.splitext(name)[0] not in set_metadata_files)
+                and (name not in set_files_in_table)
             ]
 
-            # Add a row for every video w/o metadata
-            for vid in list_videos_wo_metadata:
-                table_rows.append(
-                    {
-                        c["id"]: vid
-                        if c["id"] == app_storage["config"]["metadata_key_field_str"]
-                        else ""
-                        for c in table_columns
-                    }
-                )
-                n_clicks_add_rows_missing = 0  # reset clicks
-
             # If the original table had only one empty row: pop it
             # (it occurs if initially there are no yaml files)
             # TODO: this is a bit hacky maybe? is there a better way?
             if list_files_in_table == [""]:
-                table_rows = table_rows[1:]
+                del table_rows_patch[0]
+
+            # Add a row for every video w/o metadata
+            list_new_rows = []
+            for vid in list_videos_wo_metadata:
+                row = empty_row.copy()
+                row[key_field] = vid
+                list_new_rows.append(row)
+                n_clicks_add_rows_missing = 0  # reset clicks
+            table_rows_patch.extend(list_new_rows)
+
+        return (
+            table_rows_patch,
+            n_clicks_add_row_manually,
+            n_clicks_add_rows_missing,
+        )
 
-        return table_rows, n_clicks_add_row_manually, n_clicks_add_rows_missing
+    # Select or unselect all rows in the browser
+    # (no server round trip is needed for this)
+    # TODO: select all rows *per page*?
+    app.clientside_callback(
+        """
+        function(n_clicks_select_all, n_clicks_unselect_all, data) {
+            const trigger = dash_clientside.callback_context.triggered[0];
+            if (trigger.prop_id === "select-all-rows-button.n_clicks") {
+                return [...Array(data.length).keys()];
+            }
+            return [];
+        }
+        """,
+        Output("metadata-table", "selected_rows", allow_duplicate=True),
+        Input("select-all-rows-button", "n_clicks"),
+        Input("unselect-all-rows-button", "n_clicks"),
+        State("metadata-table", "data"),
+        prevent_initial_call=True,
+    )
 
     @app.callback(
         Output("metadata-table", "selected_rows"),
-        Output("select-all-rows-button", "n_clicks"),
-        Output("unselect-all-rows-button", "n_clicks"),
         Output("export-selected-rows-button", "n_clicks"),
         Output("alert", "is_open"),
         Output("alert", "children"),
-        Input("select-all-rows-button", "n_clicks"),
-        Input("unselect-all-rows-button", "n_clicks"),
         Input("export-selected-rows-button", "n_clicks"),
         Input("metadata-table", "data_previous"),
         State("metadata-table", "data"),
@@ -482,26 +496,23 @@ def get_callbacks(app: dash.Dash) -> None:
         State("alert", "is_open"),
     )
     def modify_rows_selection(
-        n_clicks_select_all: int,
-        n_clicks_unselect_all: int,
         n_clicks_export: int,
         data_previous: list[dict],
         data: list[dict],
         list_selected_rows: list[int],
         app_storage: dict,
         alert_state: bool,
-    ) -> tuple[list[int], int, int, int, bool, str]:
+    ) -> tuple[list[int], int, bool, str]:
         """Modify the selection status of the rows in the metadata table.
 
         A row's selection status (i.e., its checkbox) is modified if (1) the
         user edits the data on that row (then its checkbox is set to True),
-        (2) the export button is clicked (then the selected rows are reset
-        to False), or (3) the 'select/unselect' all button is clicked
+        or (2) the export button is clicked (then the selected rows are reset
+        to False). The 'select/unselect all' buttons are handled by a
+        clientside callback.
 
         Parameters
         ----------
-        n_clicks_select_all : int
-            number of clicks on the 'select all' button
         n_clicks_export : int
             number of clicks on the 'export' button
         data_previous : list[dict]
@@ -521,10 +532,6 @@ def get_callbacks(app: dash.Dash) -> None:
         -------
         list_selected_rows : list[int]
             a list of indices for the currently selected rows
-        n_clicks_select_all : int
-            number of clicks on the 'select all' button
-        n_clicks_unselect_all : int
-            number of clicks on the 'unselect all' button
         n_clicks_export : int
             number of clicks on the 'export' button
         alert_state : bool
@@ -532,7 +539,15 @@ def get_callbacks(app: dash.Dash) -> None:
         alert_message : str
             text of the information message
         """
-        # TODO: select all rows *per page*?
+        # If the export button was not clicked and the data was not edited:
+        # do not update
+        if data_previous is None and n_clicks_export == 0:
+            return (
+                dash.no_update,
+                dash.no_update,
+                dash.no_update,
+                dash.no_update,
+            )
 
         # Initialise alert message w empty
         alert_message = ""
@@ -558,10 +573,8 @@ def get_callbacks(app: dash.Dash) -> None:
             # TODO: add timestamp? remove name of files in message?
             if not alert_state:
                 alert_state = not alert_state
-            list_files = [
-                data[i][app_storage["config"]["metadata_key_field_str"]]
-                for i in list_selected_rows
-            ]
+            key_field = app_storage["config"]["metadata_key_field_str"]
+            list_files = [data[i][key_field] for i in list_selected_rows]
             alert_message = f"""Successfully exported
             {len(list_selected_rows)} yaml files: {list_files}"""
 
@@ -569,22 +582,8 @@ def get_callbacks(app: dash.Dash) -> None:
             list_selected_rows = []
             n_clicks_export = 0
 
-        # ---------------------------
-        # If 'select all' button is clicked
-        if n_clicks_select_all > 0:
-            list_selected_rows = list(range(len(data)))
-            n_clicks_select_all = 0
-
-        # ----------------------
-        # If unselect all button is clicked
-        if n_clicks_unselect_all > 0:
-            list_selected_rows = []
-            n_clicks_unselect_all = 0
-
         return (
             list_selected_rows,
-            n_clicks_select_all,
-            n_clicks_unselect_all,
             n_clicks_export,
             alert_state,
             alert_message,
@@ -633,12 +632,12 @@ def get_callbacks(app: dash.Dash) -> None:
 
         # if data is uploaded: read uploaded content as a dataframe
         if spreadsheet_uploaded_content is not None:
-            _, content_string = spreadsheet_uploaded_content.split(",")
+            _, _, content_string = spreadsheet_uploaded_content.partition(",")
             decoded = base64.b64decode(content_string)
             try:
                 # as csv
                 if "csv" in pl.Path(spreadsheet_filename).suffix:
-                    df = pd.read_csv(io.StringIO(decoded.decode("utf-8")))
+                    df = pd.read_csv(io.BytesIO(decoded), encoding="utf-8")
                 # as xls(x)
                 elif "xls" in pl.Path(spreadsheet_filename).suffix:
                     df = pd.read_excel(io.BytesIO(decoded))
@@ -1,22 +1,220 @@
+import os
 import pathlib as pl
 
 # import pdb
 import re
+import shutil
+import tempfile
+import threading
 import time
-from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Union
 
 import dash
 import plotly.express as px
 import plotly.graph_objects as go
 import yaml
-from dash import Input, Output, State
-from PIL import Image
+from dash import Input, Output, Patch, State
 
 from wazp import utils
 
-# TODO: other video extensions? have this in project config file instead?
-VIDEO_TYPES = [".avi", ".mp4"]
 ROI_CMAP = px.colors.qualitative.Dark24
+# matches the keys of single shape edits in the graph's relayoutData
+# (e.g. "shapes[2].path"), capturing the shape index and attribute
+SHAPE_KEY_RE = re.compile(r"shapes\[(\d+)\]\.(.+)")
+# skeleton of the frame graph figure, built only once
+# (the frame image and the ROI shapes are added in the callback)
+FRAME_FIGURE = (
+    go.Figure(go.Image())
+    .update_layout(
+        margin=dict(l=0, r=0, t=0, b=0),
+        yaxis={"visible": False, "showticklabels": False},
+        xaxis={"visible": False, "showticklabels": False},
+    )
+    .to_dict()
+)
+
+
+@lru_cache(maxsize=8)
+def _assign_roi_colors_cached(roi_names: tuple[str, ...]) -> dict:
+    """Match ROI names to colors of the ROI colormap,
+    reusing the mapping computed for the same ROI names.
+
+    The returned dictionary is shared between calls,
+    so it must not be modified.
+    """
+    return utils.assign_roi_colors(list(roi_names), cmap=ROI_CMAP)
+
+
+##########################
+# Fns to extract frames
+###########################
+# background extraction of the frames at the neighbouring slider steps
+# (futures are keyed by video path and frame index)
+_frame_prefetch_executor = ThreadPoolExecutor(max_workers=2)
+_prefetched_frames: dict[tuple[str, int], Future] = {}
+_prefetched_frames_lock = threading.Lock()
+
+
+def get_frame_filepath(
+    video_path_pl: pl.Path, frame_idx: int, frame_step: int, max_frame_idx: int
+) -> pl.Path:
+    """Get the path to a cached frame, extracting it if needed.
+
+    If the frame is already being extracted (in the background or
+    by another request), wait for it. Then start extracting the frames
+    at the previous and next slider steps in the background, so that
+    moving the slider does not have to wait for the frame to be extracted.
+
+    Parameters
+    ----------
+    video_path_pl : pl.Path
+        Path to the video file
+    frame_idx : int
+        Index of the frame to get
+    frame_step : int
+        Step size of the frame slider
+    max_frame_idx : int
+        Maximum frame index (num_frames - 1)
+
+    Returns
+    -------
+    pl.Path
+        Path to the cached frame file
+    """
+    video_path = video_path_pl.as_posix()
+    # Register the extraction of this frame (if not already started,
+    # or if a previous attempt failed) in the same futures dict as the
+    # background extractions, so that the same frame is never written
+    # by two threads at the same time
+    frame_key = (video_path, frame_idx)
+    with _prefetched_frames_lock:
+        previous_future = _prefetched_frames.get(frame_key)
+        extract_here = previous_future is None or (
+            previous_future.done() and previous_future.exception() is not None
+        )
+        if extract_here:
+            _prefetched_frames[frame_key] = Future()
+        frame_future = _prefetched_frames[frame_key]
+
+    # Extract the frame in this thread, rather than waiting
+    # for the background extractions to free a worker
+    if extract_here:
+        try:
+            frame_future.set_result(utils.cache_frame(video_path_pl, frame_idx))
+        except Exception as e:
+            frame_future.set_exception(e)
+            # (so that a later request tries to extract it again)
+            with _prefetched_frames_lock:
+                _prefetched_frames.pop(frame_key, None)
+    frame_filepath = frame_future.result()
+
+    keys_to_prefetch = []
+    if frame_step:
+        keys_to_prefetch = [
+            (video_path, idx)
+            for idx in (frame_idx - frame_step, frame_idx + frame_step)
+            if 0 <= idx <= max_frame_idx
+        ]
+    with _prefetched_frames_lock:
+        # Forget finished extractions that are no longer needed
+        # (their frames are cached on disk anyway)
+        for key in [
+            key
+            for key, future in _prefetched_frames.items()
+            if future.done() and key not in keys_to_prefetch
+        ]:
+            del _prefetched_frames[key]
+        for key in keys_to_prefetch:
+            if key not in _prefetched_frames:
+                _prefetched_frames[key] = _frame_prefetch_executor.submit(
+                    utils.cache_frame, video_path_pl, key[1]
+                )
+
+    return frame_filepath
+
+
+##########################
+# Fns to get dropdown options
+###########################
+def get_video_select_options(videos_dir: str) -> tuple[list[dict], str]:
+    """Get the options of the video select dropdown.
+
+    Parameters
+    ----------
+    videos_dir : str
+        path to the videos directory
+
+    Returns
+    -------
+    list[dict]
+        list of dictionaries with keys 'label' and 'value'
+    str
+        value of the first video in the list
+    """
+    # get all videos in the videos directory, sorted by name
+    video_names = sorted(
+        entry.name
+        for entry in utils.list_files_in_dir(videos_dir, utils.VIDEO_SUFFIXES)
+    )
+    # (the absolute path of the directory is only computed once)
+    videos_dir_str = pl.Path(videos_dir).absolute().as_posix()
+    video_paths_str = [f"{videos_dir_str}/{v}" for v in video_names]
+    # Video names become the labels and video paths the values
+    # of the video select dropdown
+    options = [{"label": v, "value": p} for v, p in zip(video_names, video_paths_str)]
+    value = video_paths_str[0]
+    return options, value
+
+
+def get_roi_select_options(
+    roi_names: list[str], roi_storage: dict, video_path: str
+) -> tuple[list[dict], str, dict]:
+    """Get the options of the ROI select dropdown for a video.
+
+    Parameters
+    ----------
+    roi_names : list[str]
+        names of the ROIs defined in the project config
+    roi_storage : dict
+        Dictionary storing ROI data for each video.
+    video_path : str
+        Path to the video file.
+
+    Returns
+    -------
+    list[dict]
+        list of dictionaries with keys 'label' and 'value'
+    str
+        value of the first ROI in the list
+    dict
+        dictionary with the following keys:
+            - roi2color: dict mapping ROI names to colors
+            - color2roi: dict mapping colors to ROI names
+    """
+    options = [{"label": r, "value": r} for r in roi_names]
+
+    # Get ROI-to-color mapping
+    roi_color_mapping = _assign_roi_colors_cached(tuple(roi_names))
+
+    video_name = pl.Path(video_path).name
+    # restrict ROI options to the ones not already stored
+    if video_name in roi_storage:
+        stored_roi_names = [
+            shape["roi_name"] for shape in roi_storage[video_name]["shapes"]
+        ]
+        options = [opt for opt in options if opt["value"] not in stored_roi_names]
+
+    # If there are no ROIs to draw
+    if len(options) == 0:
+        # Display a message in the ROI dropdown
+        options = [{"label": "All ROIs have been drawn.", "value": "none"}]
+
+    # Set the value to the first ROI in the list
+    value = options[0]["value"]
+
+    return options, value, roi_color_mapping
 
 
 #########################
@@ -35,48 +233,6 @@ def get_callbacks(app: dash.Dash) -> None:
         [
             Output("video-select", "options"),
             Output("video-select", "value"),
-        ],
-        Input("session-storage", "data"),
-    )
-    def update_video_select_options(
-        app_storage: dict,
-    ) -> Optional[tuple[list, str]]:
-        """Update the options of the video select dropdown.
-        Parameters
-        ----------
-        app_storage : dict
-            data held in temporary memory storage,
-            accessible to all tabs in the app
-        Returns
-        -------
-        list
-            list of dictionaries with keys 'label' and 'value'
-        str
-            value of the first video in the list
-        """
-        if "config" in app_storage.keys():
-            # Get videos directory from stored config
-            config = app_storage["config"]
-            videos_dir = config["videos_dir_path"]
-            # get all videos in the videos directory
-            video_paths = []
-            for video_type in VIDEO_TYPES:
-                video_paths += [p for p in pl.Path(videos_dir).glob(f"*{video_type}")]
-            video_paths.sort()
-            video_names = [p.name for p in video_paths]
-            video_paths_str = [p.absolute().as_posix() for p in video_paths]
-            # Video names become the labels and video paths the values
-            # of the video select dropdown
-            options = [
-                {"label": v, "value": p} for v, p in zip(video_names, video_paths_str)
-            ]
-            value = video_paths_str[0]
-            return options, value
-        else:
-            return dash.no_update, dash.no_update
-
-    @app.callback(
-        [
             Output("roi-select", "options"),
             Output("roi-select", "value"),
             Output("roi-colors-storage", "data"),
@@ -87,12 +243,20 @@ def get_callbacks(app: dash.Dash) -> None:
             Input("video-select", "value"),
         ],
     )
-    def update_roi_select_options(
+    def update_video_and_roi_select_options(
         app_storage: dict,
         roi_storage: dict,
         video_path: str,
-    ) -> Optional[tuple[list[dict], str, dict]]:
-        """Update the options of the ROI select dropdown.
+    ) -> tuple:
+        """Update the options of the video and ROI select dropdowns.
+
+        The video options and the ROI color mapping are only updated when
+        the session storage changes (i.e. when a project config is loaded).
+        The ROI options are updated for the selected video, whenever the
+        session storage, the ROI storage or the selected video change.
+        All are updated in a single callback, to avoid a separate round-trip
+        for the ROI options after the video options are updated.
+
         Parameters
         ----------
         app_storage : dict
@@ -102,10 +266,17 @@ def get_callbacks(app: dash.Dash) -> None:
             Dictionary storing ROI data for each video.
         video_path : str
             Path to the video file.
+
         Returns
         -------
+        list
+            list of dictionaries with keys 'label' and 'value'
+            for the video select dropdown
+        str
+            value of the first video in the list
         list[dict]
             list of dictionaries with keys 'label' and 'value'
+            for the ROI select dropdown
         str
             value of the first ROI in the list
         dict
@@ -113,37 +284,39 @@ def get_callbacks(app: dash.Dash) -> None:
                 - roi2color: dict mapping ROI names to colors
                 - color2roi: dict mapping colors to ROI names
         """
-        if "config" in app_storage.keys():
-            # Get ROI names from stored config
-            config = app_storage["config"]
-            roi_names = config["ROI_tags"]
-            options = [{"label": r, "value": r} for r in roi_names]
-
-            # Get ROI-to-color mapping
-            roi_color_mapping = utils.assign_roi_colors(roi_names, cmap=ROI_CMAP)
-
-            video_name = pl.Path(video_path).name
-            # restrict ROI options to the ones not already stored
-            if video_name in roi_storage.keys():
-                stored_roi_names = [
-                    shape["roi_name"] for shape in roi_storage[video_name]["shapes"]
-                ]
-                options = [
-                    opt for opt in options if opt["value"] not in stored_roi_names
-                ]
+        if "config" not in app_storage:
+            return (
+                dash.no_update,
+                dash.no_update,
+                dash.no_update,
+                dash.no_update,
+                dash.no_update,
+            )
 
-            # If there are no ROIs to draw
-            if len(options) == 0:
-                # Display a message in the ROI dropdown
-                options = [{"label": "All ROIs have been drawn.", "value": "none"}]
+        config = app_storage["config"]
+        trigger = dash.callback_context.triggered[0]["prop_id"]
 
-            # Set the value to the first ROI in the list
-            value = options[0]["value"]
+        # Update the video options (and select the first video),
+        # unless only the ROIs or the selected video changed
+        update_videos = trigger not in ("roi-storage.data", "video-select.value")
+        if update_videos:
+            video_options, video_path = get_video_select_options(
+                config["videos_dir_path"]
+            )
 
-            return options, value, roi_color_mapping
+        # Update the ROI options for the selected video
+        roi_options, roi_value, roi_color_mapping = get_roi_select_options(
+            config["ROI_tags"], roi_storage, video_path
+        )
 
-        else:
-            return dash.no_update, dash.no_update, dash.no_update
+        return (
+            video_options if update_videos else dash.no_update,
+            video_path if update_videos else dash.no_update,
+            roi_options,
+            roi_value,
+            # (the color mapping only depends on the config's ROI names)
+            roi_color_mapping if update_videos else dash.no_update,
+        )
 
     @app.callback(
         [
@@ -157,11 +330,12 @@ def get_callbacks(app: dash.Dash) -> None:
     )
     def update_frame_slider(
         video_path: str, frame_slider_storage: dict
-    ) -> tuple[int, int, int, dict]:
+    ) -> tuple[int, int, int, Patch]:
         """
         Update the frame slider parameters when a new video
         is selected. Read the parameters from storage if available,
-        otherwise extract them from the video file (slower),
+        otherwise extract them from the video file (slower, unless
+        its number of frames was cached in a previous session),
         and update the storage for future use.
 
         Parameters
@@ -185,11 +359,12 @@ def get_callbacks(app: dash.Dash) -> None:
             Frame step size.
         int
             Frame value at the middle slider step (default).
-        dict
-            Updated dictionary storing frame slider parameters for each video.
+        Patch
+            Patch adding the frame slider parameters of this video
+            to the dictionary in storage.
         """
         video_name = pl.Path(video_path).name
-        if video_name in frame_slider_storage.keys():
+        if video_name in frame_slider_storage:
             stored_video_params = frame_slider_storage[video_name]
             max_frame_idx = stored_video_params["max"]
             frame_step = stored_video_params["step"]
@@ -197,7 +372,7 @@ def get_callbacks(app: dash.Dash) -> None:
             return max_frame_idx, frame_step, middle_frame, dash.no_update
         else:
             try:
-                num_frames = utils.get_num_frames(video_path)
+                num_frames = utils.get_num_frames_cached(video_path)
             except RuntimeError as e:
                 print(e)
                 # If the number of frames cannot be extracted,
@@ -214,7 +389,10 @@ def get_callbacks(app: dash.Dash) -> None:
             # Default to the middle step
             middle_frame = frame_step * 2
             max_frame_idx = num_frames - 1
-            frame_slider_storage[video_name] = {
+            # Only add this video's parameters to the storage
+            # (without sending the whole storage back to the browser)
+            frame_slider_storage_patch = Patch()
+            frame_slider_storage_patch[video_name] = {
                 "max": max_frame_idx,
                 "step": frame_step,
                 "value": middle_frame,
@@ -223,7 +401,7 @@ def get_callbacks(app: dash.Dash) -> None:
                 max_frame_idx,
                 frame_step,
                 middle_frame,
-                frame_slider_storage,
+                frame_slider_storage_patch,
             )
 
     @app.callback(
@@ -250,7 +428,7 @@ def get_callbacks(app: dash.Dash) -> None:
         """
         if video_path is not None:
             video_name = pl.Path(video_path).name
-            if video_name not in roi_storage.keys():
+            if video_name not in roi_storage:
                 roi_storage[video_name] = {"shapes": []}
             roi_table = [
                 utils.stored_shape_to_table_row(shape)
@@ -262,17 +440,18 @@ def get_callbacks(app: dash.Dash) -> None:
 
     @app.callback(
         Output("roi-table", "style_data_conditional"),
-        Input("roi-table", "data"),
-        State("roi-colors-storage", "data"),
+        Input("roi-colors-storage", "data"),
     )
-    def set_roi_color_in_table(roi_table: list, roi_color_mapping: dict) -> list:
+    def set_roi_color_in_table(roi_color_mapping: dict) -> list:
         """
         Set the color of the ROI names in the ROI table
         based on the color assigned to that ROI shape.
+
+        The formatting rules only depend on the ROI color mapping,
+        so they are not rebuilt when the table data changes.
+
         Parameters
         ----------
-        roi_table : list
-            List of dictionaries with ROI table data.
         roi_color_mapping : dict
             Dictionary with the following keys:
                 - roi2color: dict mapping ROI names to colors
@@ -283,21 +462,21 @@ def get_callbacks(app: dash.Dash) -> None:
             List of dictionaries with conditional formatting
             rules for the ROI table.
         """
-        if len(roi_table) == 0:
+        if "roi2color" not in roi_color_mapping:
             return dash.no_update
         else:
-            cond_format = []
-            roi2color = roi_color_mapping["roi2color"]
-            for roi in roi2color.keys():
-                cond_format.append(
-                    {
-                        "if": {
-                            "column_id": "name",
-                            "filter_query": f"{{name}} = {roi}",
-                        },
-                        "color": roi2color[roi],
-                    }
-                )
+            # (ROI names are quoted in the filter queries,
+            # so that names with spaces are matched as a whole)
+            cond_format = [
+                {
+                    "if": {
+                        "column_id": "name",
+                        "filter_query": f'{{name}} = "{roi}"',
+                    },
+                    "color": color,
+                }
+                for roi, color in roi_color_mapping["roi2color"].items()
+            ]
             return cond_format
 
     @app.callback(
@@ -329,7 +508,7 @@ def get_callbacks(app: dash.Dash) -> None:
         roi_color_mapping: dict,
         roi_table_rows: list,
         roi_table_selected_rows: list,
-    ) -> tuple[dict, list]:
+    ) -> tuple[Patch, list]:
         """
         Update the ROI storage, when:
         - Shapes are added/removed from the frame graph
@@ -363,8 +542,8 @@ def get_callbacks(app: dash.Dash) -> None:
 
         Returns
         -------
-        dict
-            Updated dictionary storing ROI data for each video.
+        Patch
+            Changes to the dictionary storing ROI data for each video.
         list
             List of indices for the selected rows in the ROI table.
         """
@@ -372,13 +551,16 @@ def get_callbacks(app: dash.Dash) -> None:
         trigger = dash.callback_context.triggered[0]["prop_id"]
         video_path_pl = pl.Path(video_path)
         video_name = video_path_pl.name
+        # Only send the changes to the ROI storage to the browser
+        roi_storage_patch = Patch()
         # Create a storage entry for the video if it doesn't exist
-        if video_name not in roi_storage.keys():
+        if video_name not in roi_storage:
             roi_storage[video_name] = {"shapes": []}
+            roi_storage_patch[video_name] = {"shapes": []}
 
         # Stuff to do when a shape is drawn/deleted/modified on the graph
         if trigger == "frame-graph.relayoutData":
-            if "shapes" in graph_relayout.keys():
+            if "shapes" in graph_relayout:
                 # this means that whole shapes have been created or deleted
 
                 # Get the shapes from the graph
@@ -386,45 +568,51 @@ def get_callbacks(app: dash.Dash) -> None:
                 # Get the stored shapes for the video
                 stored_shapes = roi_storage[video_name]["shapes"]
 
+                # Shapes are identified by their line color
+                # (as in utils.shape_in_list), so compare sets of colors
+                # rather than every pair of shapes
+
                 # Figure out which stored shapes are no longer in the graph
                 # (i.e. have been deleted)
+                graph_colors = {shape["line"]["color"] for shape in graph_shapes}
                 deleted_shapes_i = [
                     i
                     for i, shape in enumerate(stored_shapes)
-                    if not utils.shape_in_list(graph_shapes)(shape)
+                    if shape["line"]["color"] not in graph_colors
                 ]
                 # remove the deleted shapes from the storage
                 for i in sorted(deleted_shapes_i, reverse=True):
                     del roi_storage[video_name]["shapes"][i]
+                    del roi_storage_patch[video_name]["shapes"][i]
 
                 # Figure out which graph shapes are new (not in storage)
+                stored_colors = {shape["line"]["color"] for shape in stored_shapes}
                 new_shapes_i = [
                     i
                     for i, shape in enumerate(graph_shapes)
-                    if not utils.shape_in_list(stored_shapes)(shape)
+                    if shape["line"]["color"] not in stored_colors
                 ]
                 new_graph_shapes = [graph_shapes[i] for i in new_shapes_i]
                 # Add the frame number and the ROI name to the new shapes
+                color2roi = roi_color_mapping["color2roi"]
                 for shape in new_graph_shapes:
                     shape["drawn_on_frame"] = frame_num
-                    shape["roi_name"] = roi_color_mapping["color2roi"][
-                        shape["line"]["color"]
-                    ]
+                    shape["roi_name"] = color2roi[shape["line"]["color"]]
                 # Pass the new shapes to the storage
                 roi_storage[video_name]["shapes"] += new_graph_shapes
+                roi_storage_patch[video_name]["shapes"].extend(new_graph_shapes)
 
-            elif re.match("shapes\[[0-9]+\].", list(graph_relayout.keys())[0]):
+            elif SHAPE_KEY_RE.match(next(iter(graph_relayout))):
                 # this means that a single shape has been edited
                 # So update only that shape in storage
-                for key in graph_relayout.keys():
-                    shape_i = int(re.findall(r"\d+", key)[0])
-                    shape_attr = key.split(".")[-1]
-                    roi_storage[video_name]["shapes"][shape_i][
-                        shape_attr
-                    ] = graph_relayout[key]
-                    roi_storage[video_name]["shapes"][shape_i][
-                        "drawn_on_frame"
-                    ] = frame_num
+                for key, value in graph_relayout.items():
+                    shape_key_match = SHAPE_KEY_RE.match(key)
+                    if shape_key_match is None:
+                        continue
+                    shape_i, shape_attr = shape_key_match.group(1, 2)
+                    shape_patch = roi_storage_patch[video_name]["shapes"][int(shape_i)]
+                    shape_patch[shape_attr] = value
+                    shape_patch["drawn_on_frame"] = frame_num
 
             else:
                 # this means that the graph was zoomed/panned
@@ -436,7 +624,7 @@ def get_callbacks(app: dash.Dash) -> None:
         elif trigger == "load-rois-button.n_clicks":
             if load_clicks > 0:
                 metadata_path = video_path_pl.with_suffix(".metadata.yaml")
-                roi_storage[video_name]["shapes"] = utils.load_rois_from_yaml(
+                roi_storage_patch[video_name]["shapes"] = utils.load_rois_from_yaml(
                     yaml_path=metadata_path
                 )
 
@@ -448,7 +636,7 @@ def get_callbacks(app: dash.Dash) -> None:
                     roi_table_rows[idx]["name"] for idx in roi_table_selected_rows
                 ]
                 stored_shapes = roi_storage[video_name]["shapes"]
-                roi_storage[video_name]["shapes"] = [
+                roi_storage_patch[video_name]["shapes"] = [
                     sh
                     for sh in stored_shapes
                     if sh["roi_name"] not in deleted_roi_names
@@ -456,7 +644,7 @@ def get_callbacks(app: dash.Dash) -> None:
                 # Clear the row selection
                 roi_table_selected_rows = []
 
-        return roi_storage, roi_table_selected_rows
+        return roi_storage_patch, roi_table_selected_rows
 
     @app.callback(
         [
@@ -472,9 +660,9 @@ def get_callbacks(app: dash.Dash) -> None:
             Input("roi-storage", "data"),
         ],
         [
-            State("frame-graph", "figure"),
             State("roi-colors-storage", "data"),
             State("frame-slider", "max"),
+            State("frame-slider", "step"),
         ],
     )
     def update_frame_graph(
@@ -482,10 +670,10 @@ def get_callbacks(app: dash.Dash) -> None:
         shown_frame_idx: int,
         roi_name: str,
         roi_storage: dict,
-        current_fig: go.Figure,
         roi_color_mapping: dict,
         max_frame_idx: int,
-    ) -> tuple[go.Figure, str, str, bool]:
+        frame_step: int,
+    ) -> tuple[Union[dict, Patch], str, str, bool]:
         """
         Update the frame graph
 
@@ -499,27 +687,27 @@ def get_callbacks(app: dash.Dash) -> None:
             Name of the next ROI to be drawn.
         roi_storage : dict
             Dictionary storing already drawn ROI shapes.
-        current_fig : plotly.graph_objects.Figure
-            Current frame graph figure.
         roi_color_mapping : dict
             Dictionary with the following keys:
                 - roi2color: dict mapping ROI names to colors
                 - color2roi: dict mapping colors to ROI names
         max_frame_idx : int
             Maximum frame index (num_frames - 1)
+        frame_step : int
+            Step size of the frame slider.
 
         Returns
         -------
-        plotly.graph_objects.Figure.Figure
-            Updated frame graph figure
+        dict or Patch
+            Updated frame graph figure: a new figure dictionary (built
+            from FRAME_FIGURE) if a new frame is shown, or a patch of
+            the current figure if only the ROIs or the next ROI changed.
         str
             Message to display in the frame status alert.
         str
             Color of the frame status alert.
         bool
             Whether to open the frame status alert.
-        int
-            Maximum frame index (num_frames - 1)
         """
 
         # If a negative frame index is passed, it means that the video
@@ -534,14 +722,6 @@ def get_callbacks(app: dash.Dash) -> None:
         video_path_pl = pl.Path(video_path)
         video_name = video_path_pl.name
 
-        # Load the stored shapes for this video (if any)
-        graph_shapes = []
-        if video_name in roi_storage.keys():
-            stored_shapes = roi_storage[video_name]["shapes"]
-            # Get rid of the custom keys that we added
-            graph_shapes = [
-                utils.shape_drop_custom_keys(shape) for shape in stored_shapes
-            ]
         # Get the color for the next ROI
         if roi_name == "none":
             # if it's none, don't allow drawing
@@ -552,37 +732,61 @@ def get_callbacks(app: dash.Dash) -> None:
             next_shape_color = roi_color_mapping["roi2color"][roi_name]
             drag_mode = "drawclosedpath"  # type: ignore
 
-        current_fig["layout"]["newshape"]["line"]["color"] = next_shape_color
-        current_fig["layout"]["dragmode"] = drag_mode
-        current_fig["layout"]["shapes"] = graph_shapes
-
         trigger = dash.callback_context.triggered[0]["prop_id"]
-        # If triggered by an update of the roi-storage or of the
-        # roi-dropdown, maintain the current figure with updated
+        # If triggered by the roi-dropdown, only update the
+        # next shape color and drag mode of the current figure
+        # (without sending the whole figure back to the browser)
+        if trigger == "roi-select.value":
+            fig_patch = Patch()
+            fig_patch["layout"]["newshape"]["line"]["color"] = next_shape_color
+            fig_patch["layout"]["dragmode"] = drag_mode
+            return fig_patch, dash.no_update, dash.no_update, dash.no_update
+
+        # Load the stored shapes for this video (if any)
+        graph_shapes = []
+        if video_name in roi_storage:
+            stored_shapes = roi_storage[video_name]["shapes"]
+            # Get rid of the custom keys that we added
+            graph_shapes = [
+                utils.shape_drop_custom_keys(shape) for shape in stored_shapes
+            ]
+
+        # If triggered by an update of the roi-storage,
+        # maintain the current figure with updated
         # shapes, next shape color and drag mode
-        if (trigger == "roi-storage.data") or (trigger == "roi-select.value"):
-            current_fig["layout"]["shapes"] = graph_shapes
-            return current_fig, dash.no_update, dash.no_update, dash.no_update
+        # (patching it, so that the frame image is not sent back and forth)
+        if trigger == "roi-storage.data":
+            fig_patch = Patch()
+            fig_patch["layout"]["newshape"]["line"]["color"] = next_shape_color
+            fig_patch["layout"]["dragmode"] = drag_mode
+            fig_patch["layout"]["shapes"] = graph_shapes
+            return fig_patch, dash.no_update, dash.no_update, dash.no_update
 
         # If triggered by a change in the video or frame
         # Load the frame into a new figure
         else:
             try:
-                frame_filepath = utils.cache_frame(video_path_pl, shown_frame_idx)
+                frame_filepath = get_frame_filepath(
+                    video_path_pl, shown_frame_idx, frame_step, max_frame_idx
+                )
             except RuntimeError as e:
                 return dash.no_update, str(e), "danger", True
 
-            new_frame = Image.open(frame_filepath)
-            new_fig = px.imshow(new_frame)
-            # Add the stored shapes and set the nextROI color
-            new_fig.update_layout(
-                shapes=graph_shapes,
-                newshape_line_color=next_shape_color,
-                dragmode=drag_mode,
-                margin=dict(l=0, r=0, t=0, b=0),
-                yaxis={"visible": False, "showticklabels": False},
-                xaxis={"visible": False, "showticklabels": False},
-            )
+            # Pass the encoded frame image directly to the figure
+            # (without decoding and re-encoding its pixels)
+            frame_data_uri = utils.load_frame_data_uri_cached(frame_filepath)
+            # Fill in a copy of the figure skeleton, adding the
+            # stored shapes and setting the next ROI color
+            # (the skeleton itself is shared, so it is not modified)
+            new_fig = {
+                "data": [{**FRAME_FIGURE["data"][0], "source": frame_data_uri}],
+                "layout": {
+                    **FRAME_FIGURE["layout"],
+                    "shapes": graph_shapes,
+                    "newshape": {"line": {"color": next_shape_color}},
+                    "dragmode": drag_mode,
+                },
+            }
             alert_msg = f"Showing frame {shown_frame_idx}/{max_frame_idx}"
             return new_fig, alert_msg, "light", True
 
@@ -623,17 +827,41 @@ def get_callbacks(app: dash.Dash) -> None:
             metadata_filepath = video_path_pl.with_suffix(".metadata.yaml")
 
             # Get the metadata from the YAML file
-            with open(metadata_filepath, "r") as yaml_file:
-                metadata = yaml.safe_load(yaml_file)
+            # (the cached copy is reused if the file has not changed
+            # and is safe to modify)
+            metadata = utils.load_yaml_file_cached(metadata_filepath)
 
             # Get the video's ROI shapes in the app
             rois_in_app = roi_storage[video_name]["shapes"]
-            # Add the ROI shapes to the metadata and save
-            with open(metadata_filepath, "w") as yaml_file:
-                metadata["ROIs"] = [
-                    utils.stored_shape_to_yaml_entry(shape) for shape in rois_in_app
-                ]
-                yaml.safe_dump(metadata, yaml_file, sort_keys=False)
+            rois_to_save = [
+                utils.stored_shape_to_yaml_entry(shape) for shape in rois_in_app
+            ]
+            # Add the ROI shapes to the metadata and save,
+            # only if they differ from those already in the file
+            if metadata.get("ROIs") != rois_to_save:
+                metadata["ROIs"] = rois_to_save
+                # Write to a temporary file next to the metadata file
+                # and then replace it, so that it is never left half-written.
+                # The path is resolved so that a symlink is not replaced,
+                # and the file's permissions are kept.
+                target_filepath = metadata_filepath.resolve()
+                yaml_file = tempfile.NamedTemporaryFile(
+                    "w", dir=target_filepath.parent, suffix=".tmp", delete=False
+                )
+                tmp_filepath = pl.Path(yaml_file.name)
+                try:
+                    with yaml_file:
+                        yaml.dump(
+                            metadata,
+                            yaml_file,
+                            Dumper=utils.SafeDumper,
+                            sort_keys=False,
+                        )
+                    shutil.copymode(target_filepath, tmp_filepath)
+                    os.replace(tmp_filepath, target_filepath)
+                except BaseException:
+                    tmp_filepath.unlink(missing_ok=True)
+                    raise
 
             # Return the download link
             return metadata_filepath.as_posix()
@@ -705,7 +933,7 @@ def get_callbacks(app: dash.Dash) -> None:
 
         # Get the app's ROI shapes for this video
         rois_in_app = []
-        if video_name in roi_storage.keys():
+        if video_name in roi_storage:
             rois_in_app = roi_storage[video_name]["shapes"]
 
         if not rois_in_app:
@@ -760,7 +988,7 @@ def get_callbacks(app: dash.Dash) -> None:
         metadata_path = video_path_pl.with_suffix(".metadata.yaml")
 
         rois_in_app = []
-        if video_name in roi_storage.keys():
+        if video_name in roi_storage:
             rois_in_app = roi_storage[video_name]["shapes"]
 
         no_rois_to_save = len(rois_in_app) == 0
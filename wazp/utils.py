@@ -1,14 +1,89 @@
+import base64
+import copy
+import hashlib
+import io
+import json
+import mimetypes
+import os
 import pathlib as pl
+import tempfile
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Callable
+from functools import lru_cache
+from typing import Any, Callable, Hashable, Union
 
 import cv2
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import shapely
 import yaml
 from shapely.geometry import Polygon
 
+# Use the faster libyaml-based loader and dumper if PyYAML was built with it
+try:
+    from yaml import CSafeDumper as SafeDumper  # noqa: F401
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeDumper, SafeLoader  # type: ignore # noqa: F401
+
+# Maximum number of parsed yaml files to keep in memory
+YAML_CACHE_MAX_SIZE = 100
+_yaml_cache: OrderedDict[Hashable, Any] = OrderedDict()
+
+# Maximum number of metadata dataframes kept in memory
+METADATA_DF_CACHE_MAX_SIZE = 32
+_metadata_df_cache: OrderedDict[Hashable, pd.DataFrame] = OrderedDict()
+
+# Lock guarding the in-memory LRU caches above
+_lru_cache_lock = threading.Lock()
+
+# Maximum number of encoded frame images to keep in memory
+FRAME_CACHE_MAX_SIZE = 8
+
+# Custom keys that we add to the ROI shapes in roi-storage
+SHAPE_CUSTOM_KEYS = frozenset({"drawn_on_frame", "roi_name"})
+
+# TODO: other video extensions? have this in project config file instead?
+VIDEO_TYPES = [".avi", ".mp4"]
+# for matching file names with str.endswith
+VIDEO_SUFFIXES = tuple(VIDEO_TYPES)
+
+
+def list_files_in_dir(
+    dir_path: Union[str, pl.Path], suffixes: Union[str, tuple[str, ...]] = ""
+) -> list[os.DirEntry]:
+    """List the regular, non-hidden files in a directory whose names
+    end with any of the input suffixes.
+
+    The directory is scanned once, and the files are matched on their
+    names only. The returned entries cache their file type and stats,
+    so callers can use their names, paths or stats without listing
+    the directory again.
+
+    Parameters
+    ----------
+    dir_path : Union[str, pl.Path]
+        path to the directory to scan
+    suffixes : Union[str, tuple[str, ...]], optional
+        lower case suffix or suffixes the file names should end with
+        (matched case-insensitively). By default all files are listed.
+
+    Returns
+    -------
+    list[os.DirEntry]
+        directory entries of the matching files, in arbitrary order
+    """
+    with os.scandir(dir_path) as it:
+        return [
+            entry
+            for entry in it
+            if entry.name.lower().endswith(suffixes)
+            and not entry.name.startswith(".")
+            and entry.is_file()
+        ]
+
 
 def df_from_metadata_yaml_files(
     parent_dir: str, metadata_fields_dict: dict
@@ -36,9 +111,7 @@ def df_from_metadata_yaml_files(
 
     # List of metadata files in parent directory
     list_metadata_files = [
-        str(f)
-        for f in pl.Path(parent_dir).iterdir()
-        if str(f).endswith(".metadata.yaml")
+        entry.path for entry in list_files_in_dir(parent_dir, ".metadata.yaml")
     ]
 
     # If there are no metadata (yaml) files:
@@ -60,7 +133,7 @@ def df_from_metadata_yaml_files(
                             k: [v if not isinstance(v, dict) else str(v)]
                             # in the df we pass to the dash table component,
                             # values need to be either str, number or bool
-                            for k, v in yaml.safe_load(ylf).items()
+                            for k, v in yaml.load(ylf, Loader=SafeLoader).items()
                         },
                         orient="columns",
                     )
@@ -92,20 +165,24 @@ def set_edited_row_checkbox_to_true(
     """
 
     # Compute difference between current and previous table
-    # TODO: faster if I compare dicts rather than dfs?
-    # (that would be: find the dict in the 'data' list with
-    # same key but different value)
     df = pd.DataFrame(data=data)
     df_previous = pd.DataFrame(data_previous)
 
-    df_diff = df.merge(df_previous, how="outer", indicator=True).loc[
-        lambda x: x["_merge"] == "left_only"
-    ]
+    if df.shape == df_previous.shape and set(df.columns) == set(df_previous.columns):
+        # If only cell values were edited: compare the tables element-wise
+        # (cells that are missing in both tables are considered equal)
+        df_previous = df_previous[df.columns]
+        df_ne = df.ne(df_previous) & ~(df.isna() & df_previous.isna())
+        list_edited_rows = np.flatnonzero(df_ne.any(axis=1).to_numpy()).tolist()
+    else:
+        df_diff = df.merge(df_previous, how="outer", indicator=True).loc[
+            lambda x: x["_merge"] == "left_only"
+        ]
+        list_edited_rows = df_diff.index.tolist()
 
     # Update the set of selected rows
-    list_selected_rows += [
-        i for i in df_diff.index.tolist() if i not in list_selected_rows
-    ]
+    set_selected_rows = set(list_selected_rows)
+    list_selected_rows += [i for i in list_edited_rows if i not in set_selected_rows]
 
     return list_selected_rows
 
@@ -296,7 +373,7 @@ def get_dataframes_to_combine(
             pl.Path(video).stem + ".metadata.yaml"
         )
         with open(yaml_filename, "r") as yf:
-            metadata = yaml.safe_load(yf)
+            metadata = yaml.load(yf, Loader=SafeLoader)
 
         # Extract frame start/end using info from slider
         frame_start_end = [metadata["Events"][x] for x in slider_start_end_labels]
@@ -544,6 +621,80 @@ def get_num_frames(video_path) -> int:
     return num_frames
 
 
+def get_num_frames_cached(
+    video_path: Union[str, pl.Path],
+    cache_dir: pl.Path = pl.Path.home() / ".WAZP" / "num_frames",
+) -> int:
+    """Get the number of frames in a video, caching it in a .WAZP folder
+    in the home directory.
+    This is to avoid opening the same video in every new session.
+
+    The cached value is only used if the video's modification time
+    and size have not changed since it was cached.
+
+    Parameters
+    ----------
+    video_path : str or pl.Path
+        Path to the video file
+    cache_dir : pl.Path
+        Path to the cache directory
+
+    Returns
+    -------
+    int
+        Number of frames in the video
+    """
+    video_path_str = os.path.abspath(video_path)
+    try:
+        stat = os.stat(video_path_str)
+    except OSError:
+        # Let get_num_frames report the unreadable video
+        return get_num_frames(video_path_str)
+    cache_filepath = cache_dir / (
+        hashlib.blake2b(video_path_str.encode(), digest_size=16).hexdigest() + ".json"
+    )
+
+    # Read the number of frames from the cache if it is up to date
+    try:
+        with open(cache_filepath) as cache_file:
+            cached = json.load(cache_file)
+        if (
+            cached["video_path"] == video_path_str
+            and cached["mtime_ns"] == stat.st_mtime_ns
+            and cached["size"] == stat.st_size
+        ):
+            return cached["num_frames"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Otherwise read it from the video and cache it
+    # (caching is best-effort: e.g. the home directory may be read-only)
+    num_frames = get_num_frames(video_path_str)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file and then replace the cache file
+        # with it, so that a half-written cache file is never read
+        tmp_fd, tmp_filepath = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(tmp_fd, "w") as cache_file:
+                json.dump(
+                    {
+                        "video_path": video_path_str,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "size": stat.st_size,
+                        "num_frames": num_frames,
+                    },
+                    cache_file,
+                )
+            os.replace(tmp_filepath, cache_filepath)
+        except OSError:
+            os.unlink(tmp_filepath)
+            raise
+    except OSError:
+        pass
+    return num_frames
+
+
 def extract_frame(video_path: str, frame_idx: int, output_path: str) -> None:
     """
     Extract a single frame from a video and save it.
@@ -600,8 +751,12 @@ def cache_frame(
     # Extract frame if it is not already cached
     if not frame_filepath.exists():
         extract_frame(video_path.as_posix(), frame_idx, frame_filepath.as_posix())
-    # Remove old frames from cache
-    remove_old_frames_from_cache(cache_dir, frame_suffix=frame_suffix, keep_last_days=1)
+        # Remove old frames from cache
+        # (only when a frame is added, so that revisiting
+        # cached frames does not scan the cache directory)
+        remove_old_frames_from_cache(
+            cache_dir, frame_suffix=frame_suffix, keep_last_days=1
+        )
 
     return frame_filepath
 
@@ -634,6 +789,42 @@ def remove_old_frames_from_cache(
     return
 
 
+@lru_cache(maxsize=FRAME_CACHE_MAX_SIZE)
+def _load_frame_data_uri(frame_filepath: str, mtime_ns: int) -> str:
+    """Read a frame image file as a base64-encoded data URI.
+
+    The modification time is only passed to be part of the cache key.
+    """
+    mime_type, _ = mimetypes.guess_type(frame_filepath)
+    with open(frame_filepath, "rb") as frame_file:
+        frame_b64 = base64.b64encode(frame_file.read()).decode("ascii")
+    return f"data:{mime_type};base64,{frame_b64}"
+
+
+def load_frame_data_uri_cached(frame_filepath: pl.Path) -> str:
+    """Load a cached frame image file as a data URI, keeping the most
+    recently loaded frames in memory.
+
+    The encoded image file is used as is, without decoding the pixels,
+    so that it can be passed directly as the source of a plotly image.
+    This also avoids re-reading the same frame multiple times,
+    e.g. when moving the frame slider back and forth.
+
+    Parameters
+    ----------
+    frame_filepath : pl.Path
+        Path to the frame image file
+
+    Returns
+    -------
+    str
+        Data URI with the base64-encoded frame image
+    """
+    return _load_frame_data_uri(
+        frame_filepath.as_posix(), frame_filepath.stat().st_mtime_ns
+    )
+
+
 def stored_shape_to_table_row(shape: dict) -> dict:
     """Converts a shape, as it is represented in
     roi-storage, to a Dash table row
@@ -740,14 +931,15 @@ def load_rois_from_yaml(yaml_path: pl.Path) -> list:
     """
     shapes_to_store = []
     if yaml_path.exists():
-        with open(yaml_path, "r") as yaml_file:
-            metadata = yaml.safe_load(yaml_file)
-            if "ROIs" in metadata:
-                shapes_to_store = [
-                    yaml_entry_to_stored_shape(roi) for roi in metadata["ROIs"]
-                ]
-            else:
-                raise KeyError(f"Could not find key 'ROIs' in {yaml_path}")
+        # (parsed yaml is cached, since the ROI callbacks
+        # read the same metadata file repeatedly)
+        metadata = load_yaml_file_cached(yaml_path)
+        if "ROIs" in metadata:
+            shapes_to_store = [
+                yaml_entry_to_stored_shape(roi) for roi in metadata["ROIs"]
+            ]
+        else:
+            raise KeyError(f"Could not find key 'ROIs' in {yaml_path}")
     else:
         raise FileNotFoundError(f"Could not find {yaml_path}")
 
@@ -770,7 +962,169 @@ def shape_drop_custom_keys(shape: dict) -> dict:
     plotly.graph_objects.Figure complains if we include custom
     keys in the shape dictionary, so we remove them here
     """
-    new_shape = dict()
-    for k in shape.keys() - {"drawn_on_frame", "roi_name"}:
-        new_shape[k] = shape[k]
-    return new_shape
+    return {k: v for k, v in shape.items() if k not in SHAPE_CUSTOM_KEYS}
+
+
+def _get_from_lru_cache(
+    cache: OrderedDict[Hashable, Any],
+    max_size: int,
+    key: Hashable,
+    load_fn: Callable[[], Any],
+) -> Any:
+    """Get a value from an in-memory LRU cache, computing it with
+    `load_fn` and adding it to the cache if it is not there yet.
+
+    The least recently used entry is dropped if the cache exceeds
+    `max_size` entries. The caches are guarded by a lock, since callbacks
+    run in multiple threads, but `load_fn` runs outside of it so that
+    other threads are not blocked. The cached value itself is returned,
+    so callers should copy it before modifying it.
+
+    Parameters
+    ----------
+    cache : OrderedDict[Hashable, Any]
+        the cache, ordered from least to most recently used
+    max_size : int
+        maximum number of entries in the cache
+    key : Hashable
+        key identifying the value
+    load_fn : Callable[[], Any]
+        function that computes the value
+
+    Returns
+    -------
+    Any
+        the cached value
+    """
+    with _lru_cache_lock:
+        is_cached = key in cache
+        if is_cached:
+            cache.move_to_end(key)
+            value = cache[key]
+
+    if not is_cached:
+        value = load_fn()
+        with _lru_cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > max_size:
+                cache.popitem(last=False)
+    return value
+
+
+def _get_from_yaml_cache(key: Hashable, load_fn: Callable[[], Any]) -> Any:
+    """Get parsed yaml data from the in-memory LRU cache, parsing it with
+    `load_fn` if it is not there yet.
+
+    A deep copy of the cached data is returned, so that callers can
+    safely modify it.
+
+    Parameters
+    ----------
+    key : Hashable
+        key identifying the yaml content
+    load_fn : Callable[[], Any]
+        function that parses the yaml content
+
+    Returns
+    -------
+    Any
+        the parsed yaml data
+    """
+    return copy.deepcopy(
+        _get_from_lru_cache(_yaml_cache, YAML_CACHE_MAX_SIZE, key, load_fn)
+    )
+
+
+def load_yaml_content_cached(content: bytes) -> Any:
+    """Parse yaml content, reusing the result if the same content
+    has been parsed before.
+
+    The content is identified by its hash.
+
+    Parameters
+    ----------
+    content : bytes
+        yaml content to parse
+
+    Returns
+    -------
+    Any
+        the parsed yaml data
+    """
+    key = ("content", hashlib.blake2b(content, digest_size=16).hexdigest())
+    return _get_from_yaml_cache(
+        key, lambda: yaml.load(io.BytesIO(content), Loader=SafeLoader)
+    )
+
+
+def load_yaml_file_cached(yaml_path: Union[str, pl.Path]) -> Any:
+    """Parse a yaml file, reusing the result if the file has been
+    parsed before and has not changed since.
+
+    The file is identified by its path, modification time and size.
+
+    Parameters
+    ----------
+    yaml_path : str or pl.Path
+        path to the yaml file
+
+    Returns
+    -------
+    Any
+        the parsed yaml data
+    """
+    stat = os.stat(yaml_path)
+
+    def load_fn() -> Any:
+        with open(yaml_path) as yf:
+            return yaml.load(yf, Loader=SafeLoader)
+
+    key = ("file", os.fspath(yaml_path), stat.st_mtime_ns, stat.st_size)
+    return _get_from_yaml_cache(key, load_fn)
+
+
+def df_from_metadata_yaml_files_cached(
+    parent_dir: str, metadata_fields_dict: dict
+) -> pd.DataFrame:
+    """Build a dataframe from all the metadata.yaml files in the input parent
+    directory, reusing the result if none of the metadata files has changed.
+
+    The metadata files are identified by their names, modification times
+    and sizes. This is safer than using the modification time of the
+    directory, which does not change when an existing file is overwritten.
+
+    Parameters
+    ----------
+    parent_dir : str
+        path to directory with video metadata.yaml files
+    metadata_fields_dict : dict
+        dictionary with metadata fields descriptions
+
+    Returns
+    -------
+    pd.DataFrame
+        a pandas dataframe in which each row holds the metadata for one video
+    """
+    files_stats = [
+        (entry.name, entry.stat())
+        for entry in list_files_in_dir(parent_dir, ".metadata.yaml")
+    ]
+    files_fingerprint = tuple(
+        sorted((name, stat.st_mtime_ns, stat.st_size) for name, stat in files_stats)
+    )
+    key = (
+        os.path.abspath(parent_dir),
+        files_fingerprint,
+        tuple(metadata_fields_dict),
+    )
+
+    df = _get_from_lru_cache(
+        _metadata_df_cache,
+        METADATA_DF_CACHE_MAX_SIZE,
+        key,
+        lambda: df_from_metadata_yaml_files(parent_dir, metadata_fields_dict),
+    )
+
+    # return a copy, so that callers can safely modify it
+    return df.copy()